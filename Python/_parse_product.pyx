@@ -0,0 +1,227 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+'''
+_parse_product.pyx
+Native parser for product CSV files, used by process_product_data when it is built:
+    cythonize -i _parse_product.pyx
+'''
+
+import csv
+import mmap
+import os
+
+import numpy as np
+
+# Exact powers of ten in double precision, 10^0 .. 10^22
+cdef double _POW10[23]
+_POW10[0] = 1.0
+for _i in range(1, 23):
+    _POW10[_i] = _POW10[_i - 1] * 10.0
+
+# Largest integer below which every integer is exact in double precision
+cdef unsigned long long _MAX_EXACT_MANTISSA = 1ULL << 53
+
+cdef enum:
+    _COMMA = 44
+    _QUOTE = 34
+    _SPACE = 32
+    _LF = 10
+    _CR = 13
+
+
+cdef inline bint _is_space(unsigned char c) noexcept nogil:
+    return c == _SPACE or (9 <= c <= 13)
+
+
+cdef inline bint _parse_float(const unsigned char* p, Py_ssize_t length, double* result) noexcept nogil:
+    """
+    Parses [sign] digits [. digits] [e [sign] digits] when both the mantissa and the power of ten
+    are exact doubles, so that a single multiplication or division rounds correctly.
+    Returns False for anything else, which is then left to Python's float().
+    """
+    cdef Py_ssize_t i = 0
+    cdef bint negative = False, any_digits = False, exponent_negative = False
+    cdef unsigned long long mantissa = 0
+    cdef int significant_digits = 0, exponent = 0, exponent_value = 0
+
+    if i < length and (p[i] == c'-' or p[i] == c'+'):
+        negative = p[i] == c'-'
+        i += 1
+    while i < length and c'0' <= p[i] <= c'9':
+        if significant_digits == 19:
+            return False
+        mantissa = mantissa * 10 + (p[i] - c'0')
+        if mantissa:
+            significant_digits += 1
+        any_digits = True
+        i += 1
+    if i < length and p[i] == c'.':
+        i += 1
+        while i < length and c'0' <= p[i] <= c'9':
+            if significant_digits == 19:
+                return False
+            mantissa = mantissa * 10 + (p[i] - c'0')
+            if mantissa:
+                significant_digits += 1
+            exponent -= 1
+            any_digits = True
+            i += 1
+    if not any_digits:
+        return False
+    if i < length and (p[i] == c'e' or p[i] == c'E'):
+        i += 1
+        if i < length and (p[i] == c'-' or p[i] == c'+'):
+            exponent_negative = p[i] == c'-'
+            i += 1
+        if i == length:
+            return False
+        while i < length and c'0' <= p[i] <= c'9':
+            if exponent_value > 1000:
+                return False
+            exponent_value = exponent_value * 10 + (p[i] - c'0')
+            i += 1
+        exponent += -exponent_value if exponent_negative else exponent_value
+    if i != length or mantissa > _MAX_EXACT_MANTISSA:
+        return False
+
+    if mantissa == 0:
+        result[0] = 0.0
+    elif 0 <= exponent <= 22:
+        result[0] = mantissa * _POW10[exponent]
+    elif -22 <= exponent < 0:
+        result[0] = mantissa / _POW10[-exponent]
+    else:
+        return False
+    if negative:
+        result[0] = -result[0]
+    return True
+
+
+cdef inline Py_ssize_t _scan_cell(const unsigned char* data, Py_ssize_t pos, Py_ssize_t size,
+                                  Py_ssize_t* start, Py_ssize_t* stop, bint* escaped) noexcept nogil:
+    """
+    Finds the cell that begins at pos the way csv.reader with skipinitialspace=True does.
+    Sets [start, stop) to its text without the quotes and returns the position of the
+    character that ends it: a comma, a line end, or size.
+    """
+    cdef bint quoted = False
+    escaped[0] = False
+    while pos < size and data[pos] == _SPACE:
+        pos += 1
+    if pos < size and data[pos] == _QUOTE:
+        quoted = True
+        pos += 1
+        start[0] = pos
+        while pos < size:
+            if data[pos] == _QUOTE:
+                if pos + 1 < size and data[pos + 1] == _QUOTE:
+                    escaped[0] = True
+                    pos += 2
+                    continue
+                break
+            pos += 1
+        stop[0] = pos
+        if pos < size:
+            pos += 1  # closing quote
+    else:
+        start[0] = pos
+    # Text after a closing quote is not expected in product files and is skipped
+    while pos < size and data[pos] != _COMMA and data[pos] != _LF and data[pos] != _CR:
+        pos += 1
+    if not quoted:
+        stop[0] = pos
+    return pos
+
+
+cdef inline Py_ssize_t _next_line(const unsigned char* data, Py_ssize_t pos, Py_ssize_t size) noexcept nogil:
+    """
+    Returns the start of the line after the line end at pos (\\n, \\r\\n or \\r).
+    """
+    if pos < size and data[pos] == _CR:
+        pos += 1
+    if pos < size and data[pos] == _LF:
+        pos += 1
+    return pos
+
+
+cdef str _cell_text(const unsigned char* data, Py_ssize_t start, Py_ssize_t stop, bint escaped):
+    text = data[start:stop].decode('utf-8')
+    return text.replace('""', '"') if escaped else text
+
+
+cdef tuple _parse(const unsigned char[::1] buffer):
+    cdef Py_ssize_t size = buffer.shape[0]
+    cdef const unsigned char* data = &buffer[0]
+    cdef Py_ssize_t pos = 0, start = 0, stop = 0, first, last, max_rows_count = 1
+    cdef Py_ssize_t rows_count = 0, j, mixes_count
+    cdef bint escaped = False
+    cdef double value = 0.0
+    cdef float[:, ::1] table
+    cdef double[::1] sums
+
+    # Header: the first line holds the mix names (skip the first empty column)
+    while pos < size and data[pos] != _LF and data[pos] != _CR:
+        pos += 1
+    header = next(csv.reader([_cell_text(data, 0, pos, False)], skipinitialspace=True), [])
+    mix_names = [name for name in header[1:] if name.strip()]
+    mixes_count = len(mix_names)
+    pos = _next_line(data, pos, size)
+
+    # Line ends after the header bound the number of ingredient rows
+    for j in range(pos, size):
+        if data[j] == _LF or data[j] == _CR:
+            max_rows_count += 1
+    percentage_table = np.empty((max_rows_count, mixes_count), dtype=np.float32)
+    column_sums = np.zeros(mixes_count)
+    table = percentage_table
+    sums = column_sums
+    ingredient_names = []
+
+    while pos < size:
+        # Column 0 holds the ingredient name; rows without one are skipped
+        pos = _scan_cell(data, pos, size, &start, &stop, &escaped)
+        ingredient_name = _cell_text(data, start, stop, escaped).strip()
+        if ingredient_name:
+            # Empty cells mean the ingredient is not used in the mix
+            for j in range(mixes_count):
+                if pos == size or data[pos] != _COMMA:
+                    raise ValueError(f"Row '{ingredient_name}' has {j} percentages, expected {mixes_count}")
+                pos = _scan_cell(data, pos + 1, size, &start, &stop, &escaped)
+                if start == stop:
+                    value = 0.0
+                else:
+                    first = start
+                    last = stop
+                    while first < last and _is_space(data[first]):
+                        first += 1
+                    while last > first and _is_space(data[last - 1]):
+                        last -= 1
+                    if escaped or not _parse_float(data + first, last - first, &value):
+                        text = _cell_text(data, start, stop, escaped)
+                        value = 0.0 if text.isspace() else float(text)
+                table[rows_count, j] = <float>value
+                sums[j] += table[rows_count, j]
+            ingredient_names.append(ingredient_name)
+            rows_count += 1
+
+        # Cells after the last mix are ignored
+        while pos < size and data[pos] == _COMMA:
+            pos = _scan_cell(data, pos + 1, size, &start, &stop, &escaped)
+        pos = _next_line(data, pos, size)
+
+    return mix_names, ingredient_names, percentage_table[:rows_count], column_sums
+
+
+def parse_product_csv(path):
+    """
+    Parses a UTF-8 product CSV file like the csv.reader path of ProductTableReaderWriter,
+    scanning the memory-mapped bytes directly instead of building a string per cell.
+
+    Returns:
+        tuple: (mix_names, ingredient_names, percentage_table, column_sums), where
+               percentage_table is a row-major float32 array and column_sums are float64
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:  # an empty file cannot be mapped
+            return [], [], np.empty((0, 0), dtype=np.float32), np.zeros(0)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            return _parse(mapped_file)
@@ -1,16 +1,39 @@
 import json
+import math
 from typing import Optional, Tuple
 import sys
 import numpy as np
 
 import process_product_data as ppd
 
+try:
+    # Ahead-of-time compiled kernel, built by running mrc_kernels.py
+    from mrc_kernels_aot import compute_target_table
+except ImportError:
+    from mrc_kernels import compute_target_table
+
 '''
 material_requirements_calculations.py
 Updated 2025-08-07 16:24
 '''
 DEFAULT_TARGET_AMOUNT = 100.0
 
+# Validation lets the last mix sum to 100 within PERCENTAGE_SUM_MAX_DEVIATION, so its amount may
+# differ from the target amount as much relatively, plus the float32 rounding of the target table
+LAST_MIX_REL_TOLERANCE = ppd.PERCENTAGE_SUM_MAX_DEVIATION / 100.0 + 1e-6
+
+
+def _to_csc(table: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compressed sparse column form of table: (column_starts, row_indices, values).
+    """
+    # Nonzeros of the transpose come out ordered by column, then by row
+    column_indices, row_indices = np.nonzero(table.T)
+    values = table[row_indices, column_indices]
+    column_starts = np.zeros(table.shape[1] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(column_indices, minlength=table.shape[1]), out=column_starts[1:])
+    return column_starts, row_indices.astype(np.int64), values
+
 
 class MaterialRequirementsCalculations:
     """
@@ -26,18 +49,26 @@ class MaterialRequirementsCalculations:
     def __init__(self, product_name : str):
         self.product_name = product_name
         self.reader = ppd.ProductTableReaderWriter(product_name, ppd.DEFAULT_PRODUCTS_DIRECTORY, ppd.DEFAULT_CALCULATIONS_DIRECTORY)        
-        self.reader.read()
+        self.percentage_table, self.raw_material_names, self.mix_names, self.ingredient_names = self.reader.read()
 
-        self.percentage_table = self.reader.percentage_table   
-        self.raw_material_names = self.reader.raw_material_names
-        self.mix_names = self.reader.mix_names
-        self.ingredient_names = self.reader.ingredient_names
+        # Most ingredients are used in only a few mixes, so the calculation walks
+        # the nonzero percentages of each mix only
+        self.percentage_csc = _to_csc(self.percentage_table)
 
         self.raw_material_count = len(self.raw_material_names)
         self.mixes_count = len(self.mix_names)
         self.ingredient_count = len(self.ingredient_names) 
+
+        # Table headers and row labels of the results, the same for every request
+        self._header_line = f"{'':<15}" + "".join(f"{header:>10}" for header in self.mix_names)
+        self._target_header_line = self._header_line + f"{'BOM':>10}"
+        self._row_labels = [f"{row_name:<15}" for row_name in self.ingredient_names]
+
+        # Target table and its row totals for a target amount of 1.0, computed on first use
+        self._unit_table = None
+        self._unit_row_totals = None
     
-    def _calculate_material_requirements(self, target_amount:float=DEFAULT_TARGET_AMOUNT) -> np.ndarray:
+    def _calculate_material_requirements(self, target_amount:float=DEFAULT_TARGET_AMOUNT, verbose: bool = False) -> Tuple[np.ndarray, np.ndarray]:
         """
         Calculate material requirements using the linear algorithm.
         
@@ -45,54 +76,37 @@ class MaterialRequirementsCalculations:
             percentage_table: The percentage table P where P[i,j] is the percentage 
                             of ingredient i used in mix j
             target_amount: The target amount of the final product
+            verbose: Print the amount calculated on each step
             
         Returns:
             np.ndarray: The target table A where A[i,j] is the amount of ingredient i 
                        used in mix j
+            np.ndarray: The totals of every row of A
         """
       
         n, m = self.percentage_table.shape
-        target_table = np.zeros((n, m))
-        
-        # Step 1: Calculate the last mix (target product)
-        # A[i,m] = T * P[i,m] / 100 for i = 1 to n+m-1
-        mix_m_total = 0
-        for i in range(n):            
-            target_table[i, m-1] = target_amount * self.percentage_table[i, m-1] / 100.0
-            mix_m_total += target_table[i, m-1]
+        # The target table is linear in target_amount, so it is calculated once
+        # for 1.0 and then only scaled
+        if self._unit_table is None:
+            self._unit_table, self._unit_row_totals = compute_target_table(self.percentage_table, *self.percentage_csc, 1.0)
+        target_table = self._unit_table * target_amount
+        row_totals = self._unit_row_totals * target_amount
         
-        # Set Target Mix as sum of all it's ingridients. It should equal to target_amount
-        if (mix_m_total == target_amount):
-            target_table[i, m-1] = mix_m_total
-        else:
+        # Target Mix is the sum of all it's ingridients. It should equal to target_amount
+        mix_m_total = target_table[n-1, m-1]
+        if not math.isclose(mix_m_total, target_amount, rel_tol=LAST_MIX_REL_TOLERANCE):
             raise ValueError("Last mix did not match target_amount: " + str(mix_m_total) + " vs." + str(target_amount))
 
-        print(f"\nStep 1: Last mix (Mix {m}) calculated")
-        print(f"Target amount: {target_amount}")
-        print(f"Mix {m} amounts: {target_table[:, m-1]}")
-        
-        # Step 2: Calculate remaining mixes working backwards
-        current_table_row_with_mix = n-1
-        for j in range(m-2, -1, -1):  # From second-to-last mix to first mix
-            # Calculate the amount of mix j needed (Statement 1)
-            # T_j = sum of all amounts of mix j used in subsequent mixes
-            current_table_row_with_mix -= 1
-            mix_j_amount = sum(target_table[current_table_row_with_mix,:]) 
-            
-            print(f"\nStep {m-j}: Calculating Mix {j+1}")
-            print(f"Mix {j+1} amount needed: {mix_j_amount}")
+        if verbose:
+            print(f"\nStep 1: Last mix (Mix {m}) calculated")
+            print(f"Target amount: {target_amount}")
+            print(f"Mix {m} amounts: {np.array2string(target_table[:, m-1], threshold=10)}")
             
-            # Calculate amounts for mix j
-            # A[i,j] = T_j * P[i,j] / 100 for i = 1 to n+j
-            for i in range(min(n+j+1, target_table.shape[0])):
-                target_table[i, j] = mix_j_amount * self.percentage_table[i, j] / 100.0
-
-            # Set the amount of mix j itself (it should be equal to the amount needed)
-            target_table[current_table_row_with_mix, j] = mix_j_amount   
-            
-            #print(f"Mix {j+1} amounts: {target_table[:, j]}")
+            for j in range(m-2, -1, -1):
+                print(f"\nStep {m-j}: Calculating Mix {j+1}")
+                print(f"Mix {j+1} amount needed: {target_table[n-m+j, j]}")
         
-        return target_table
+        return target_table, row_totals
 
     def persist_calculation_request(self, results_string):
         """
@@ -101,21 +115,26 @@ class MaterialRequirementsCalculations:
         """
 
     
-    def get_raw_material_totals(self, target_table: np.ndarray) -> np.ndarray:
+    def get_raw_material_totals(self, target_table: np.ndarray, row_totals: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Calculate the total amount of each raw material needed.
         
         Args:
             target_table: The target table A
+            row_totals: Row totals of A as returned by _calculate_material_requirements;
+                        when given, A is not summed again
             
         Returns:
             np.ndarray: Array of total amounts for each raw material
         """
-        raw_material_totals = np.sum(target_table[:self.raw_material_count, :], axis=1)
+        if row_totals is not None:
+            return row_totals[:self.raw_material_count]
+
+        raw_material_totals = target_table[:self.raw_material_count, :].sum(axis=1)
         return raw_material_totals  
         
     def _get_results_string(self, percentage_table: np.ndarray, target_table: np.ndarray, 
-                        target_amount: float) -> str:
+                        target_amount: float, row_totals: Optional[np.ndarray] = None) -> str:
         """
         Generate the results as a formatted string.
 
@@ -123,6 +142,7 @@ class MaterialRequirementsCalculations:
             percentage_table: The original percentage table
             target_table: The calculated target table
             target_amount: The target amount
+            row_totals: Optional row totals of the target table
 
         Returns:
             A string containing the formatted results
@@ -137,43 +157,25 @@ class MaterialRequirementsCalculations:
         lines.append("\nPERCENTAGE TABLE (Original):")
         lines.append("-" * 65)
 
-        headers = self.mix_names
-        row_names = self.ingredient_names
-
         # Header row
-        header_line = f"{'':<15}" + "".join(f"{header:>10}" for header in headers)
-        lines.append(header_line)
+        lines.append(self._header_line)
 
         # Data rows
-        for i, row_name in enumerate(row_names):
-            row_line = f"{row_name:<15}"
-            for j in range(self.mixes_count):
-                if i < self.ingredient_count and j < self.mixes_count:
-                    row_line += f"{percentage_table[i, j]:>10.1f}"
-                else:
-                    row_line += f"{'':>10}"
-            lines.append(row_line)
+        # (tolist converts each row to Python floats in one call instead of per cell)
+        for row_label, row in zip(self._row_labels, percentage_table.tolist()):
+            lines.append(row_label + "".join(f"{value:>10.1f}" for value in row))
 
         # Target table
         lines.append("\nTARGET TABLE (Calculated):")
         lines.append("-" * 65)
 
-        # Create a copy of headers + "BOM" without modifying self.mix_names
-        headers_with_bom = headers + ["BOM"]
-
         # Header row
-        target_header_line = f"{'':<15}" + "".join(f"{header:>10}" for header in headers_with_bom)
-        lines.append(target_header_line)
+        lines.append(self._target_header_line)
 
         # Rows with data + BOM column
-        raw_material_totals = self.get_raw_material_totals(target_table)
-        for i, row_name in enumerate(row_names):
-            row_line = f"{row_name:<15}"
-            for j in range(self.mixes_count):
-                if i < self.ingredient_count and j < self.mixes_count:
-                    row_line += f"{target_table[i, j]:>10.1f}"
-                else:
-                    row_line += f"{'':>10}"
+        raw_material_totals = self.get_raw_material_totals(target_table, row_totals)
+        for i, (row_label, row) in enumerate(zip(self._row_labels, target_table.tolist())):
+            row_line = row_label + "".join(f"{value:>10.1f}" for value in row)
 
             if i < len(raw_material_totals):
                 row_line += f"{raw_material_totals[i]:>10.1f}"
@@ -183,7 +185,7 @@ class MaterialRequirementsCalculations:
             lines.append(row_line)
 
         # BOM Total
-        lines.append(f"\nTotal raw materials needed: {np.sum(raw_material_totals):.1f}")
+        lines.append(f"\nTotal raw materials needed: {raw_material_totals.sum():.1f}")
 
         # finish output
         lines.append(f"\n{'='*80}")
@@ -191,7 +193,7 @@ class MaterialRequirementsCalculations:
 
         return "\n".join(lines)
 
-    def calculateBOM(self, target_amount: float = DEFAULT_TARGET_AMOUNT):
+    def calculateBOM(self, target_amount: float = DEFAULT_TARGET_AMOUNT, verbose: bool = False):
         """
         Encapsulate entire process
         1. Calculate Target Table
@@ -200,34 +202,32 @@ class MaterialRequirementsCalculations:
         """  
 
         # Calculate Target Table
-        target_table = self._calculate_material_requirements(target_amount) 
+        target_table, row_totals = self._calculate_material_requirements(target_amount, verbose) 
        
         # Print everythig for display
-        results_string = self._get_results_string(self.percentage_table, target_table, target_amount)
-        print(results_string)
+        results_string = self._get_results_string(self.percentage_table, target_table, target_amount, row_totals)
+        sys.stdout.write(results_string + "\n")
 
         # Persist the results
         self.reader.writeCalculationRequest(results_string)
 
 def main():
     """
-    Main function to demonstrate the algorithm with the example from the article.
+    Main function to calculate the BOM of a product given on the command line,
+    or of the example from the article when no arguments are given.
     """
-    product_name = "ActicleExampleProduct"
-    mrc = MaterialRequirementsCalculations(product_name)    
-    target_amount = 5000.0  
+    if len(sys.argv) == 3:
+        product_name = sys.argv[1]
+        target_amount = float(sys.argv[2])
+    elif len(sys.argv) == 1:
+        product_name = "ArticleExampleProduct"
+        target_amount = 5000.0
+    else:
+        print("Usage: python material_requirements_calculations.py <ProductName> <TargetAmount>")
+        sys.exit(1)
+
+    mrc = MaterialRequirementsCalculations(product_name)
     mrc.calculateBOM(target_amount)
 
 if __name__ == "__main__":
-    #if len(sys.argv) != 3:
-    #    print("Usage: python material_requirements_calculations.py <ProductName> <TargetAmount>")
-    #    sys.exit(1)
-
-    #product_name = sys.argv[1]
-    #target_amount = float(sys.argv[2])
-
-    product_name = "ArticleExampleProduct"
-    target_amount = 5000   
-
-    mrc = MaterialRequirementsCalculations(product_name)
-    mrc.calculateBOM(target_amount)
\ No newline at end of file
+    main()
@@ -0,0 +1,111 @@
+import os
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # Numba is optional: without it the kernel runs as plain NumPy code
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+'''
+mrc_kernels.py
+Numeric kernels of the material requirements calculations.
+
+Running this file compiles the kernels ahead of time into the mrc_kernels_aot
+extension module (requires Numba and a C compiler). When that module is present
+material_requirements_calculations and process_product_data import it instead,
+so no JIT compilation happens at run time.
+'''
+
+AOT_MODULE_NAME = "mrc_kernels_aot"
+
+
+# Compiled serially: the array expressions only cover the few nonzeros of one column, too
+# little work to split across threads on every step of the loop over the mixes.
+@njit(cache=True, fastmath=True)
+def compute_target_table(percentage_table: np.ndarray, column_starts: np.ndarray, row_indices: np.ndarray,
+                         values: np.ndarray, target_amount: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Numeric core of the linear algorithm, compiled with Numba when it is installed.
+    column_starts, row_indices and values are the nonzero entries of percentage_table
+    in compressed sparse column (CSC) form: the entries of column j are at positions
+    column_starts[j]:column_starts[j+1].
+    Returns the target table A, where the amount of mix j itself is stored in its own row,
+    and the totals of every row of A.
+    """
+    n, m = percentage_table.shape
+    # Rows are the raw materials followed by the mixes, so mix j is in row n-m+j
+    # (row n+j in the article, where n counts raw materials only)
+    first_mix_row = n - m
+    inv100 = 0.01
+
+    # Step 1: The last mix is the target product
+    # Step 2: Amounts of the remaining mixes, working backwards (Statement 1):
+    # T_j = sum of T_k * P[mix j, k] / 100 over subsequent mixes k.
+    # The mix rows of P form a strictly upper-triangular m x m block, so this is a
+    # back substitution on that block only; the full table is not touched here.
+    mix_amounts = np.zeros(m)
+    mix_amounts[m-1] = target_amount
+    for j in range(m-2, -1, -1):  # From second-to-last mix to first mix
+        mix_amounts[j] = (percentage_table[first_mix_row+j, j+1:] * mix_amounts[j+1:]).sum() * inv100
+
+    # A[i,j] = T_j * P[i,j] / 100, written one column at a time for the nonzero P[i,j] only.
+    # Column-major (n, m) table, allocated in a form Numba also accepts.
+    target_table = np.zeros((m, n), dtype=percentage_table.dtype).T
+    # Row totals are accumulated in double precision whatever the table dtype
+    row_totals = np.zeros(n)
+    for j in range(m):
+        rows = row_indices[column_starts[j]:column_starts[j+1]]
+        mix_j = values[column_starts[j]:column_starts[j+1]] * (mix_amounts[j] * inv100)
+        target_table[rows, j] = mix_j
+        row_totals[rows] += mix_j
+        # Set the amount of mix j itself. For the last mix it is the sum of its
+        # ingredients, which the caller checks against target_amount.
+        mix_j_amount = mix_j.sum() if j == m-1 else mix_amounts[j]
+        target_table[first_mix_row+j, j] = mix_j_amount
+        row_totals[first_mix_row+j] += mix_j_amount
+
+    return target_table, row_totals
+
+
+# Only the reassociation flags of fastmath: they let the row loop vectorize, while
+# a NaN column sum must still fail the check
+@njit(cache=True, fastmath={'reassoc', 'nsz', 'contract'})
+def first_invalid_column(percentage_table: np.ndarray, max_deviation: float) -> Tuple[int, float]:
+    """
+    Validation of a whole percentage table: sums the columns in float64 in one pass over
+    the rows and checks that each sum is within max_deviation of 100.
+    Returns (index of the first invalid mix, its sum), or (-1, 0.0) if all are valid.
+    """
+    n, m = percentage_table.shape
+    column_sums = np.zeros(m)
+    for i in range(n):
+        for j in range(m):
+            column_sums[j] += percentage_table[i, j]
+    for j in range(m):
+        if not abs(column_sums[j] - 100.0) <= max_deviation:
+            return j, column_sums[j]
+    return -1, 0.0
+
+
+def build_aot_module():
+    """
+    Compile the kernels into the AOT_MODULE_NAME extension next to this file.
+    """
+    from numba.pycc import CC
+
+    cc = CC(AOT_MODULE_NAME)
+    cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+    # Column-major float32 percentage table, its CSC arrays and a float64 target amount
+    cc.export("compute_target_table",
+              "Tuple((f4[::1,:], f8[:]))(f4[::1,:], i8[::1], i8[::1], f4[::1], f8)")(compute_target_table.py_func)
+    # float32 percentage table of any layout and the allowed deviation of a column sum from 100
+    cc.export("first_invalid_column", "Tuple((i8, f8))(f4[:,:], f8)")(first_invalid_column.py_func)
+    cc.compile()
+
+
+if __name__ == "__main__":
+    build_aot_module()
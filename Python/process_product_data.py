@@ -1,9 +1,32 @@
+import array
 import csv
 from datetime import datetime
+import importlib.util
+import io
+import logging
 import os
+from typing import List, Optional, Tuple
 
 import numpy as np
 
+# pandas is optional: without it the CSV is parsed with csv.reader. It is only imported
+# when a product is parsed with it, since the import takes longer than most products.
+_PANDAS_AVAILABLE = importlib.util.find_spec("pandas") is not None
+
+try:
+    # Ahead-of-time compiled validation kernel, built by running mrc_kernels.py. Without it
+    # the table is validated with NumPy: JIT compiling or loading the kernel would cost more
+    # than validating a product takes.
+    from mrc_kernels_aot import first_invalid_column as _first_invalid_column_kernel
+except ImportError:
+    _first_invalid_column_kernel = None
+
+try:
+    import _parse_product
+except ImportError:
+    # The native parser is optional: build it with "cythonize -i _parse_product.pyx"
+    _parse_product = None
+
 '''
 process_product_data.py
 Updated 2025-08-07 16:24
@@ -12,6 +35,100 @@ Updated 2025-08-07 16:24
 DEFAULT_PRODUCTS_DIRECTORY = "products"
 DEFAULT_CALCULATIONS_DIRECTORY = "calculation_requests"
 
+# Products and calculation requests directories are relative to this file
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Percentages are bounded by 100 and carry at most a few decimals, so product tables are
+# parsed straight into float32. Every path sums the columns in float64, so rounding the cells
+# to float32 moves a column sum by at most 100 * 2**-24 (about 6e-6) however long the table,
+# well within the tolerance when checking that each mix adds up to 100.
+PERCENTAGE_SUM_TOLERANCE = 1e-4
+# np.isclose adds its relative tolerance of 1e-5, so a valid mix may differ from 100 by this much
+PERCENTAGE_SUM_MAX_DEVIATION = PERCENTAGE_SUM_TOLERANCE + 1e-5 * 100.0
+
+_log = logging.getLogger(__name__)
+
+# Rows parsed between two column-sum updates; small enough for the block to stay in cache
+_SUM_BLOCK_ROWS = 4096
+
+
+def _mix_names_from_header(header: List[str]) -> List[str]:
+    """
+    Extract mix names from the CSV header row (skip the first empty column).
+    """
+    return [name for name in header[1:] if name.strip()]
+
+
+def _ingredient_rows(reader, mixes_count: int):
+    """
+    Yields (ingredient_name, percentages) for the CSV rows that have an ingredient name;
+    blank cells mean the ingredient is not used in the mix. Rows with fewer than mixes_count
+    percentage cells raise ValueError.
+    The reader must be created with skipinitialspace=True, so cells of spaces arrive empty
+    and float() handles any trailing spaces itself.
+    """
+    for row in reader:
+        ingredient_name = row[0].strip() if row else ''
+        if not ingredient_name:  # Rows without ingredient name are skipped
+            continue
+        cells = row[1:1 + mixes_count]
+        if len(cells) != mixes_count:
+            raise ValueError(f"Row '{ingredient_name}' has {len(cells)} percentages, expected {mixes_count}")
+        try:
+            percentages = [float(cell) if cell else 0.0 for cell in cells]
+        except ValueError:
+            # Blank cells can also hold whitespace that skipinitialspace keeps, such as tabs
+            percentages = [float(cell) if cell and not cell.isspace() else 0.0 for cell in cells]
+        yield ingredient_name, percentages
+
+
+def _first_short_row(content: bytes, mixes_count: int) -> Optional[Tuple[str, int]]:
+    """
+    Finds the first ingredient row of the CSV content with fewer than mixes_count percentage
+    cells, which pandas.read_csv would silently fill up.
+    
+    Returns:
+        tuple: (ingredient_name, percentages_count) of that row, or None if there is none
+    """
+    if b'"' in content:
+        # Quoted cells may hold commas and line ends, so only csv.reader can count them
+        reader = csv.reader(io.StringIO(content.decode('utf-8'), newline=''), skipinitialspace=True)
+        next(reader, None)
+        rows = reader
+    else:
+        # Count the commas of every line with NumPy and look closer at the short lines only
+        data = np.frombuffer(content, dtype=np.uint8)
+        line_ends = np.flatnonzero((data == ord('\n')) | (data == ord('\r')))
+        line_starts = np.concatenate(([0], line_ends + 1))
+        line_ends = np.append(line_ends, len(data))
+        commas_per_line = np.diff(np.searchsorted(np.flatnonzero(data == ord(',')), line_ends), prepend=0)
+        short_lines = np.flatnonzero((commas_per_line < mixes_count) & (line_ends > line_starts))
+        rows = (next(csv.reader([content[line_starts[k]:line_ends[k]].decode('utf-8')], skipinitialspace=True))
+                for k in short_lines if k > 0)
+    for row in rows:
+        ingredient_name = row[0].strip() if row else ''
+        if ingredient_name and len(row) - 1 < mixes_count:
+            return ingredient_name, len(row) - 1
+    return None
+
+
+def _buffer_rows(buffer: array.array, mixes_count: int, first_row: int = 0) -> np.ndarray:
+    """
+    View the rows of a flat float32 buffer from first_row on as a (rows, mixes_count) table.
+    The buffer cannot grow while the view is alive.
+    """
+    offset = first_row * mixes_count * buffer.itemsize
+    return np.frombuffer(buffer, dtype=np.float32, offset=offset).reshape(-1, mixes_count)
+
+
+def _first_invalid_column(column_sums: np.ndarray) -> int:
+    """
+    Index of the first mix whose percentages do not sum to 100, or -1 if all do.
+    """
+    column_is_valid = np.isclose(column_sums, 100.0, rtol=0.0, atol=PERCENTAGE_SUM_MAX_DEVIATION)
+    return -1 if column_is_valid.all() else int(np.argmin(column_is_valid))
+
+
 class ProductTableReaderWriter:
     """
     Class to read a product CSV file and convert it into a structured format.
@@ -28,11 +145,11 @@ class ProductTableReaderWriter:
         :param product_filename: Name of the product file (e.g., 'Product1.csv')
         :param products_dir: Directory where product files are stored (default 'products')
         """
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        self.product_file_path = os.path.join(script_dir, products_dir, product_filename + ".csv")
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        filename_with_timestamp = f"{product_filename}_{timestamp}.txt"
-        self.calculation_request_file_path = os.path.join(script_dir, calculation_requests_dir, filename_with_timestamp)
+        self.product_file_path = os.path.join(_SCRIPT_DIR, products_dir, product_filename + ".csv")
+        # The timestamped calculation request file name is only made when a request is written
+        self._product_filename = product_filename
+        self._calculation_requests_dir_path = os.path.join(_SCRIPT_DIR, calculation_requests_dir)
+        self.calculation_request_file_path = None
 
         self.percentage_table = None
         self.raw_material_names = []
@@ -42,45 +159,162 @@ class ProductTableReaderWriter:
     def read(self):
         """
         Reads the product CSV file and populates the table, ingredient names, and mix names.
+        
+        Returns:
+            tuple: (percentage_table, raw_material_names, mix_names, ingredient_names), where
+                   percentage_table is a column-major float32 array
+        """
+        parsed = None
+        try:
+            if _parse_product is not None:
+                parsed = _parse_product.parse_product_csv(self.product_file_path)
+            elif _PANDAS_AVAILABLE:
+                parsed = (*self._parse_pandas(), None)
+        except UnicodeDecodeError:
+            # The native and pandas parsers read UTF-8. Files in another encoding, such as the
+            # cp1252 Excel saves on Windows, are read by csv.reader in the locale encoding.
+            parsed = None
+        if parsed is None:
+            parsed = self._parse_csv()
+        self.mix_names, self.ingredient_names, data, column_sums = parsed
+
+        # raw_material_names are all the igridents less mixes
+        mix_name_set = set(self.mix_names)
+        self.raw_material_names = [name for name in self.ingredient_names if name not in mix_name_set]
+
+        self.percentage_table = data
+
+        if (not self._validate_percentage_table(column_sums)):  
+            raise ValueError("Invalid percentage table")        
+
+        # Calculations walk the table one mix (column) at a time
+        self.percentage_table = np.asfortranarray(self.percentage_table)
+        return self.percentage_table, self.raw_material_names, self.mix_names, self.ingredient_names
+
+    def _parse_csv(self) -> Tuple[List[str], List[str], np.ndarray, np.ndarray]:
+        """
+        Parses the product CSV file with csv.reader.
+        
+        Returns:
+            tuple: (mix_names, ingredient_names, percentage_table, column_sums)
         """
         with open(self.product_file_path, newline='') as csvfile:
-            reader = list(csv.reader(csvfile))
+            reader = csv.reader(csvfile, skipinitialspace=True)
 
-            # Extract mix names (skip the first empty column)
-            self.mix_names = [name for name in reader[0][1:] if name.strip()]
-            mixes_count = len(self.mix_names)
+            mix_names = _mix_names_from_header(next(reader))
+            mixes_count = len(mix_names)
+            ingredient_names = []
 
-            # Extract ingredient names and data rows
-            data_rows = []
-            for row in reader[1:]:
-                if row[0].strip():  # Non-empty ingredient name
-                    self.ingredient_names.append(row[0].strip())
-                    data_rows.append([
-                        float(cell) if cell.strip() else 0.0
-                        for cell in row[1:1 + mixes_count]
-                    ])
+            # Extract ingredient names and append their rows to a flat float32 buffer,
+            # which holds 4 bytes per cell instead of a Python float object and is
+            # viewed as the table without another copy.
+            # Column sums for validation are added up block by block while each block
+            # of rows is still in cache, so validation needs no second pass over the table.
+            buffer = array.array('f')
+            column_sums = np.zeros(mixes_count)
+            rows_count = 0
+            block_start = 0
+            for ingredient_name, percentages in _ingredient_rows(reader, mixes_count):
+                ingredient_names.append(ingredient_name)
+                buffer.extend(percentages)
+                rows_count += 1
+                if rows_count - block_start == _SUM_BLOCK_ROWS:
+                    column_sums += _buffer_rows(buffer, mixes_count, block_start).sum(axis=0, dtype=np.float64)
+                    block_start = rows_count
+            column_sums += _buffer_rows(buffer, mixes_count, block_start).sum(axis=0, dtype=np.float64)
 
-            # raw_material_names are all the igridents less mixes
-            self.raw_material_names = [name for name in self.ingredient_names if name not in self.mix_names]
+        return mix_names, ingredient_names, _buffer_rows(buffer, mixes_count), column_sums
 
-            # Convert data to NumPy array
-            self.percentage_table = np.array(data_rows, dtype=float)
+    def _parse_pandas(self) -> Tuple[List[str], List[str], np.ndarray]:
+        """
+        Parses the product CSV file with the C tokenizer of pandas.read_csv.
+        
+        Returns:
+            tuple: (mix_names, ingredient_names, percentage_table)
+        """
+        import pandas as pd
 
-        if (not self._validate_percentage_table()):  
-            raise ValueError("Invalid percentage table")        
+        with open(self.product_file_path, newline='') as csvfile:
+            mix_names = _mix_names_from_header(next(csv.reader(csvfile, skipinitialspace=True), []))
+        mixes_count = len(mix_names)
+        with open(self.product_file_path, 'rb') as f:
+            content = f.read()
 
-    def _validate_percentage_table(self) -> bool:
+        # pandas fills up short rows, which csv.reader rejects
+        short_row = _first_short_row(content, mixes_count)
+        if short_row is not None:
+            raise ValueError(f"Row '{short_row[0]}' has {short_row[1]} percentages, expected {mixes_count}")
+
+        # Column 0 holds the ingredient names, the next mixes_count columns the
+        # percentages; empty cells mean the ingredient is not used in the mix
+        try:
+            df = pd.read_csv(io.BytesIO(content), header=None, skiprows=1, usecols=range(1 + mixes_count),
+                             engine='c', skipinitialspace=True, dtype={j: (str if j == 0 else np.float32) for j in range(1 + mixes_count)},
+                             keep_default_na=False, na_values={j: [''] for j in range(1, 1 + mixes_count)})
+        except pd.errors.EmptyDataError:
+            # No ingredient rows, which validation rejects
+            return mix_names, [], np.empty((0, mixes_count), dtype=np.float32)
+        except ValueError:
+            # Cells read_csv cannot convert, such as blanks holding tabs, are left to csv.reader,
+            # which reads them like the other paths or raises the float() error
+            mix_names, ingredient_names, data, _ = self._parse_csv()
+            return mix_names, ingredient_names, data
+
+        # Rows without ingredient name are skipped
+        names = df[0].str.strip()
+        has_ingredient_name = (names != '').to_numpy()
+        data = df.iloc[:, 1:].fillna(0.0).to_numpy(dtype=np.float32)[has_ingredient_name]
+        return mix_names, names[has_ingredient_name].tolist(), data
+
+    def read_chunked(self, chunk_rows: int = 100_000):
+        """
+        Reads the product CSV file in chunks of at most chunk_rows ingredient rows, so memory
+        stays bounded for products too large to load at once. mix_names is populated before
+        the first chunk is yielded.
+        Column sums are accumulated chunk by chunk and checked once the whole file is read.
+        
+        Yields:
+            tuple: (ingredient_names, percentage_rows) for each chunk
+        """
+        with open(self.product_file_path, newline='') as csvfile:
+            reader = csv.reader(csvfile, skipinitialspace=True)
+
+            self.mix_names = _mix_names_from_header(next(reader))
+            mixes_count = len(self.mix_names)
+
+            column_sums = np.zeros(mixes_count)
+            ingredient_names = []
+            data = np.empty((chunk_rows, mixes_count), dtype=np.float32)
+            for ingredient_name, percentages in _ingredient_rows(reader, mixes_count):
+                data[len(ingredient_names)] = percentages
+                ingredient_names.append(ingredient_name)
+                if len(ingredient_names) == chunk_rows:
+                    column_sums += data.sum(axis=0, dtype=np.float64)
+                    yield ingredient_names, data
+                    ingredient_names = []
+                    data = np.empty((chunk_rows, mixes_count), dtype=np.float32)
+
+            if ingredient_names:
+                data = data[:len(ingredient_names)]
+                column_sums += data.sum(axis=0, dtype=np.float64)
+                yield ingredient_names, data
+
+        j = _first_invalid_column(column_sums)
+        if j >= 0:
+            raise ValueError(f"Invalid percentage table: Column {j+1} does not sum to 100. Sum = {column_sums[j]}")
+
+    def _validate_percentage_table(self, column_sums: Optional[np.ndarray] = None) -> bool:
         """
         Validate that the percentage table meets the requirements.
         
         Args:
-            table: The percentage table P
+            column_sums: Column sums of the percentage table if already computed while parsing
             
         Returns:
             bool: True if valid, False otherwise
         """
         if self.percentage_table.ndim != 2:
-            print("Error: Table must be 2-dimensional")
+            _log.error("Table must be 2-dimensional")
             return False
         
         n, m = self.percentage_table.shape
@@ -89,33 +323,42 @@ class ProductTableReaderWriter:
         self.total_rows = n
         self.total_cols = m
         
-        # Check that each column sums to 100 for the defined elements
-        for j in range(m):
-            # For column j, we need to check only the non-zero elements
-            # The table structure shows that not all ingredients are used in each mix
-            column = self.percentage_table[:, j]
-            # Only consider non-zero elements as defined for this mix
-            non_zero_elements = column[column != 0]
-            #print(f"Column {j+1}: {column}")
-            #print(f"  Non-zero elements: {non_zero_elements} (sum = {np.sum(non_zero_elements)})")
-            if not np.isclose(np.sum(non_zero_elements), 100.0, atol=1e-6):
-                print(f"Error: Column {j+1} does not sum to 100. Sum = {np.sum(non_zero_elements)}")
-                return False
-            #print(f"  ✓ Column {j+1} is valid")
+        # Check that each column sums to 100 (ingredients not used in a mix are 0 and add nothing).
+        # Sums are in float64 like on the other paths: float32 sums of long tables drift by more
+        # than the tolerance.
+        if column_sums is None and _first_invalid_column_kernel is not None:
+            j, column_sum = _first_invalid_column_kernel(self.percentage_table, PERCENTAGE_SUM_MAX_DEVIATION)
+        else:
+            if column_sums is None:
+                column_sums = self.percentage_table.sum(axis=0, dtype=np.float64)
+            j = _first_invalid_column(column_sums)
+            column_sum = column_sums[j]
+        if j >= 0:
+            _log.error("Column %d does not sum to 100. Sum = %s", j + 1, column_sum)
+            return False
         
-        print(f"Valid table: {self.raw_materials_count} raw materials, {self.mixes_count} mixes")
+        _log.info("Valid table: %d raw materials, %d mixes", self.raw_materials_count, self.mixes_count)
         return True
 
     def writeCalculationRequest(self, results_string):
         """
         Writes the product calculated CSV file including ingridients, mixees, Bill of Material
         """
-        with open(self.calculation_request_file_path, "w", encoding="utf-8") as f:
-            f.write(results_string)
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        filename_with_timestamp = f"{self._product_filename}_{timestamp}.txt"
+        self.calculation_request_file_path = os.path.join(self._calculation_requests_dir_path, filename_with_timestamp)
+        # Encode the whole result once and write it in binary mode with a single call,
+        # translating newlines the way text mode did
+        if os.linesep != "\n":
+            results_string = results_string.replace("\n", os.linesep)
+        data = results_string.encode("utf-8")
+        with open(self.calculation_request_file_path, "wb", buffering=max(1 << 20, len(data))) as f:
+            f.write(data)
 
 # Example usage:
 if __name__ == "__main__":
-    reader = ProductTableReaderWriter("Product1", "products")
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    reader = ProductTableReaderWriter("ArticleExampleProduct")
     reader.read()
     print("\npercentage_table:\n" + str(reader.percentage_table))    
     print("\nraw_material_names:\n" + str(reader.raw_material_names))
@@ -0,0 +1,33 @@
+import unittest
+
+import numpy as np
+
+import material_requirements_calculations as mrc
+
+'''
+test_material_requirements_calculations.py
+Run with: python -m unittest
+'''
+
+PRODUCT_NAMES = ("ArticleExampleProduct", "OrigWebExample")
+TARGET_AMOUNTS = (0.5, 1000.0, 5000.0)
+
+
+class TargetTableTest(unittest.TestCase):
+
+    def test_target_table_is_linear_in_target_amount(self):
+        # _calculate_material_requirements scales the table calculated for a target amount
+        # of 1.0, which is only right because the algorithm is linear in the target amount
+        for product_name in PRODUCT_NAMES:
+            calculations = mrc.MaterialRequirementsCalculations(product_name)
+            for target_amount in TARGET_AMOUNTS:
+                with self.subTest(product_name=product_name, target_amount=target_amount):
+                    target_table, row_totals = calculations._calculate_material_requirements(target_amount)
+                    expected_table, expected_row_totals = mrc.compute_target_table(
+                        calculations.percentage_table, *calculations.percentage_csc, target_amount)
+                    np.testing.assert_allclose(target_table, expected_table, rtol=1e-5)
+                    np.testing.assert_allclose(row_totals, expected_row_totals, rtol=1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+
+from test_process_product_data import SAMPLE_PRODUCT_NAMES, ProductFileTestCase, random_product, sample_product
+
+try:
+    import _parse_product
+except ImportError:
+    _parse_product = None
+
+'''
+test_parse_product.py
+Checks the native parser against the csv.reader path. Run with: python -m unittest
+'''
+
+
+@unittest.skipIf(_parse_product is None, "_parse_product is not built")
+class ParseProductTest(ProductFileTestCase):
+
+    def assertSameParse(self, content: str):
+        reader = self._reader(content)
+        expected, actual = reader._parse_csv(), _parse_product.parse_product_csv(reader.product_file_path)
+        self.assertEqual(actual[0], expected[0])
+        self.assertEqual(actual[1], expected[1])
+        np.testing.assert_array_equal(actual[2], expected[2])
+        np.testing.assert_array_equal(actual[3], expected[3])
+
+    def test_sample_products(self):
+        for product_name in SAMPLE_PRODUCT_NAMES:
+            with self.subTest(product_name=product_name):
+                self.assertSameParse(sample_product(product_name))
+
+    def test_random_product(self):
+        self.assertSameParse(random_product(1))
+
+    def test_random_product_without_quotes(self):
+        self.assertSameParse(random_product(2, quoted=False))
+
+    def test_header_only(self):
+        self.assertSameParse(',A,B\n')
+
+    def test_invalid_cell(self):
+        with self.assertRaisesRegex(ValueError, "could not convert string to float: 'abc'"):
+            _parse_product.parse_product_csv(self._reader(',A\nr1,abc\nA,100\n').product_file_path)
+
+    def test_short_row(self):
+        with self.assertRaisesRegex(ValueError, "Row 'r2' has 1 percentages, expected 2"):
+            _parse_product.parse_product_csv(self._reader(',A,B\nr1,50,\nr2,50\n').product_file_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import process_product_data as ppd
+
+'''
+test_process_product_data.py
+Run with: python -m unittest
+'''
+
+SAMPLE_PRODUCT_NAMES = ("ArticleExampleProduct", "OrigWebExample")
+RANDOM_ROWS_COUNT = 3000
+
+
+def sample_product(product_name: str) -> str:
+    with open(ppd.ProductTableReaderWriter(product_name).product_file_path, newline='') as f:
+        return f.read()
+
+
+def _random_cell(rng: random.Random, quoted: bool) -> str:
+    """
+    A percentage cell in one of the forms product files may hold.
+    """
+    kind = rng.randrange(12)
+    value = rng.uniform(0.0, 100.0)
+    if kind == 0:
+        return ''
+    if kind == 1:
+        return rng.choice(['  ', '\t', ' \t '])
+    if kind == 2:
+        return f' "{value:.3f}"' if quoted else f' {value:.3f}'
+    if kind == 3:
+        return f'{value:.17g}'
+    if kind == 4:
+        return f'{value:.3e}'
+    if kind == 5:
+        return rng.choice(['1_0', '.5 ', '-0', '+7.', '12345678901234567890'])
+    return f'{value:.4f}'
+
+
+def random_product(seed: int, quoted: bool = True) -> str:
+    """
+    Product CSV content mixing the cell forms, blank and repeated names, extra cells and
+    LF and CRLF line ends. Without quoted, no cell holds a quote.
+    """
+    rng = random.Random(seed)
+    names = ['Water', '', ' Oil ', 'Mix A']
+    if quoted:
+        names += [' "Salt, fine" ', 'Oil "x"', '"A""B"']
+    lines = [', "Mix A" ,Mix B,Mix C\n' if quoted else ', Mix A ,Mix B,Mix C\n']
+    for i in range(RANDOM_ROWS_COUNT):
+        cells = [rng.choice(names)] + [_random_cell(rng, quoted) for _ in range(3)]
+        if i % 7 == 0:
+            cells.append('extra')
+        lines.append(','.join(cells) + rng.choice(['\n', '\r\n']))
+    return ''.join(lines)
+
+
+class ProductFileTestCase(unittest.TestCase):
+    """
+    Writes product files to a temporary products directory.
+    """
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _reader(self, content: str, encoding: str = 'utf-8') -> ppd.ProductTableReaderWriter:
+        reader = ppd.ProductTableReaderWriter("product")
+        reader.product_file_path = os.path.join(self._directory.name, "product.csv")
+        with open(reader.product_file_path, 'w', newline='', encoding=encoding) as f:
+            f.write(content)
+        return reader
+
+
+class ReadChunkedTest(ProductFileTestCase):
+
+    def test_chunks_match_read(self):
+        reader = self._reader(sample_product("ArticleExampleProduct"))
+        chunks = list(reader.read_chunked(chunk_rows=4))
+        self.assertEqual([len(names) for names, _ in chunks], [4, 4, 1])
+
+        table, _, mix_names, ingredient_names = reader.read()
+        self.assertEqual(reader.mix_names, mix_names)
+        self.assertEqual([name for names, _ in chunks for name in names], ingredient_names)
+        np.testing.assert_array_equal(np.concatenate([rows for _, rows in chunks]), table)
+
+    def test_short_row(self):
+        reader = self._reader(',A,B\nr1,100\n')
+        with self.assertRaisesRegex(ValueError, "Row 'r1' has 1 percentages, expected 2"):
+            list(reader.read_chunked())
+
+    def test_invalid_column(self):
+        reader = self._reader(',A,B\nr1,100,40\nA,,50\nB,,\n')
+        with self.assertRaisesRegex(ValueError, "Column 2 does not sum to 100"):
+            list(reader.read_chunked())
+
+
+@unittest.skipIf(not ppd._PANDAS_AVAILABLE, "pandas is not installed")
+class ParsePandasTest(ProductFileTestCase):
+    """
+    Checks the pandas path against the csv.reader path.
+    """
+
+    def assertSameParse(self, content: str):
+        reader = self._reader(content)
+        expected, actual = reader._parse_csv(), reader._parse_pandas()
+        self.assertEqual(actual[0], expected[0])
+        self.assertEqual(actual[1], expected[1])
+        np.testing.assert_array_equal(actual[2], expected[2])
+
+    def assertSameError(self, content: str, message: str):
+        reader = self._reader(content)
+        for parse in (reader._parse_csv, reader._parse_pandas):
+            with self.subTest(parse=parse.__name__):
+                with self.assertRaises(ValueError) as context:
+                    parse()
+                self.assertEqual(str(context.exception), message)
+
+    def test_sample_products(self):
+        for product_name in SAMPLE_PRODUCT_NAMES:
+            with self.subTest(product_name=product_name):
+                self.assertSameParse(sample_product(product_name))
+
+    def test_random_product(self):
+        self.assertSameParse(random_product(1))
+
+    def test_random_product_without_quotes(self):
+        self.assertSameParse(random_product(2, quoted=False))
+
+    def test_header_only(self):
+        self.assertSameParse(',A,B\n')
+        self.assertSameParse(',A,B\r\n\r\n')
+
+    def test_short_row(self):
+        message = "Row 'r2' has 1 percentages, expected 2"
+        self.assertSameError(',A,B\nr1,50,\nr2,50\nA,,100\nB,,\n', message)
+        self.assertSameError(',A,B\r\nr1,50,50\r\n,\r\nr2,50', message)
+        self.assertSameError(',A,B\n"r1",50,\nr2,50\n', message)
+
+    def test_invalid_cell(self):
+        self.assertSameError(',A\nr1,abc\nA,100\n', "could not convert string to float: 'abc'")
+
+
+class ReadTest(ProductFileTestCase):
+
+    def test_non_utf8_product_is_read_with_csv_reader(self):
+        # Excel on Windows saves CSV files in cp1252, which only the csv.reader path reads,
+        # in the locale encoding
+        reader = self._reader(',A\nCr\xe8me,100\nA,\n', encoding='cp1252')
+        parsed = (['A'], ['Cr\xe8me', 'A'], np.array([[100.0], [0.0]], dtype=np.float32), np.array([100.0]))
+        with mock.patch.object(ppd.ProductTableReaderWriter, '_parse_csv', return_value=parsed) as parse_csv:
+            self.assertEqual(reader.read()[1], ['Cr\xe8me'])
+        parse_csv.assert_called_once_with()
+
+
+class ValidationTest(unittest.TestCase):
+
+    def _validate(self, percentage_table: np.ndarray) -> bool:
+        reader = ppd.ProductTableReaderWriter("product")
+        reader.percentage_table = percentage_table
+        return reader._validate_percentage_table()
+
+    def test_long_column_is_summed_in_double_precision(self):
+        # A float32 sum of these cells drifts to about 99.9954, outside the tolerance
+        self.assertTrue(self._validate(np.full((300_000, 1), 0.000333333, dtype=np.float32)))
+
+    def test_invalid_column(self):
+        self.assertFalse(self._validate(np.full((300_000, 1), 0.00033, dtype=np.float32)))
+
+
+if __name__ == "__main__":
+    unittest.main()